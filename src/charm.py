@@ -8,11 +8,15 @@ Mimir Writer ingests metrics and stores it into long term object storage.
 This charm deploys the write pathway of Mimir.
 """
 
+import hashlib
+import json
 import logging
 import socket
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 
 from ops.charm import CharmBase
+from ops.framework import StoredState
 from ops.main import main
 from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
 from charms.prometheus_k8s.v0.prometheus_remote_write import (
@@ -20,7 +24,7 @@ from charms.prometheus_k8s.v0.prometheus_remote_write import (
 )
 from mimir_writer.alertmanager import (
     DEFAULT_ALERT_TEMPLATE,
-    DEFAULT_ALERTMANAGER_CONFIG,
+    DEFAULT_ALERTMANAGER_CONFIG_YAML,
     AlertManager,
 )
 from mimir_writer.config import (
@@ -40,18 +44,28 @@ from mimir_writer.config import (
     store_gateway_config,
 )
 
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
 logger = logging.getLogger(__name__)
 
 
 class MimirWriterCharm(CharmBase):
     """Charm the service."""
 
+    _stored = StoredState()
+
     def __init__(self, *args):
         super().__init__(*args)
+        self._stored.set_default(config_hash=None, group_digests={})
         self._name = "mimir-writer"
         self._peername = "mimir-writer-peers"
         self._reader_relation = "mimir-writer"  # relation name with Mimir reader charm
         self._alertmanager = AlertManager()
+        self._hostname = None
 
         # library objects for managing charm relations
         self.remote_write_provider = PrometheusRemoteWriteProvider(
@@ -77,6 +91,9 @@ class MimirWriterCharm(CharmBase):
         started.
         """
         self._create_mimir_dirs()
+        # a new workload container does not have any configuration yet
+        self._stored.config_hash = None
+        self._stored.group_digests = {}
         self._set_mimir_config()
 
         # Get a reference the container attribute on the PebbleReadyEvent
@@ -108,13 +125,16 @@ class MimirWriterCharm(CharmBase):
         Configuration changes are handled by setting a new Mimir
         and Alertmanager configuration and restarting Mimir. Also
         it is check if replication has been enabled without object
-        storage and in this case blocked status is set.
+        storage and in this case blocked status is set. Mimir is
+        only restarted if its configuration has changed.
         """
-        self._set_mimir_config()
+        config_changed = self._set_mimir_config()
         self._set_alertmanager_config()
-        mimir_restarted = self._restart_mimir()
 
-        if mimir_restarted:
+        if config_changed:
+            self._restart_mimir()
+
+        if self.unit.get_container(self._name).can_connect():
             self.unit.status = ActiveStatus()
 
         if self.app.planned_units() > 1 and not self.config.get("s3", ""):
@@ -127,11 +147,13 @@ class MimirWriterCharm(CharmBase):
     def _on_mimir_reader_relation_chagned(self, _):
         """Handle changes in relation with Mimir reader."""
         logger.debug("Readers related to Mimir writer: %s", self.readers)
-        self._set_mimir_config()
+        config_changed = self._set_mimir_config()
         self._set_alertmanager_config()
-        mimir_restarted = self._restart_mimir()
 
-        if mimir_restarted:
+        if config_changed:
+            self._restart_mimir()
+
+        if self.unit.get_container(self._name).can_connect():
             self.unit.status = ActiveStatus()
 
     def _on_remote_write_relation_changed(self, _):
@@ -148,8 +170,12 @@ class MimirWriterCharm(CharmBase):
             return
 
         alerts_for_all_relations = self.remote_write_provider.alerts()
-        for _, alerts in alerts_for_all_relations.items():
-            self._set_alert_rules(alerts["groups"])
+        groups = [
+            group
+            for alerts in alerts_for_all_relations.values()
+            for group in alerts["groups"]
+        ]
+        self._set_alert_rules(groups)
 
     def _restart_mimir(self):
         """Restart Mimir workload."""
@@ -159,23 +185,36 @@ class MimirWriterCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
-        container.stop(self._name)
-        container.start(self._name)
+        container.restart(self._name)
         self.unit.status = ActiveStatus()
 
         return True
 
     def _set_mimir_config(self):
-        """Generate and set a Mimir workload configuration."""
+        """Generate and set a Mimir workload configuration.
+
+        The configuration file is only pushed to the workload if
+        it differs from the configuration that was last pushed.
+
+        Returns:
+            True if a new configuration was pushed to the workload,
+            False otherwise.
+        """
         container = self.unit.get_container(self._name)
 
         if not container.can_connect():
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
-        # push mimr config file to workload
         mimir_config = self._mimir_config()
+        config_hash = hashlib.blake2b(mimir_config.encode("utf-8"), digest_size=16).hexdigest()
+        if config_hash == self._stored.config_hash:
+            logger.debug("Mimir configuration unchanged")
+            return False
+
+        # push mimr config file to workload
         container.push(MIMIR_CONFIG_FILE, mimir_config, make_dirs=True)
+        self._stored.config_hash = config_hash
         logger.info("Set new Mimir configuration")
 
         return True
@@ -194,16 +233,22 @@ class MimirWriterCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
-        for _, path in MIMIR_DIRS.items():
-            if not container.exists(path):
-                container.make_dir(path, make_parents=True)
+        # make_parents also makes creating an existing directory a no-op
+        for path in MIMIR_DIRS.values():
+            container.make_dir(path, make_parents=True)
 
         return True
 
     def _mimir_config(self) -> str:
         """Generate a Mimir workload configuration."""
-        s3_config = yaml.safe_load(self.config.get("s3", "{}"))
-        retention_period = self.config.get("tsdb_block_retention_period", "24h")
+        charm_config = self.config
+        # s3 credentials are usually given as JSON, which is also valid YAML
+        s3 = charm_config.get("s3", "") or "{}"
+        try:
+            s3_config = json.loads(s3)
+        except json.JSONDecodeError:
+            s3_config = yaml.load(s3, Loader=SafeLoader)
+        retention_period = charm_config.get("tsdb_block_retention_period", "24h")
 
         config = {
             "multitenancy_enabled": False,
@@ -219,7 +264,7 @@ class MimirWriterCharm(CharmBase):
             "memberlist": memberlist_config(self.unit.name, self.peers, self.readers),
         }
 
-        return yaml.dump(config)
+        return yaml.dump(config, Dumper=SafeDumper, sort_keys=False, default_flow_style=False)
 
     def _set_alertmanager_config(self):
         """Set the Mimir Alertmanager configuration.
@@ -235,8 +280,9 @@ class MimirWriterCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting for Pebble ready")
             return False
 
-        cfg = self.config["alertmanager_template"] or DEFAULT_ALERT_TEMPLATE
-        tpl = self.config["alertmanager_config"] or yaml.dump(DEFAULT_ALERTMANAGER_CONFIG)
+        charm_config = self.config
+        cfg = charm_config["alertmanager_template"] or DEFAULT_ALERT_TEMPLATE
+        tpl = charm_config["alertmanager_config"] or DEFAULT_ALERTMANAGER_CONFIG_YAML
         aconfig = {
             "template_files": {
                 "default_template": cfg,
@@ -244,27 +290,78 @@ class MimirWriterCharm(CharmBase):
             "alertmanager_config": tpl,
         }
         self._alertmanager.set_config(aconfig)
+        self._alertmanager.close()
 
         return True
 
     def _set_alert_rules(self, groups):
         """Set a new alert rule group in Mimir Alertmanager.
 
+        Alert rule groups that are unchanged since they were last set
+        are skipped. Previously set alert rule groups that are not
+        in the given list are deleted.
+
         Args:
             groups: a list of alert rule groups. Each item in the list
             is a single alert rule group represent by a dictionary. This
             dictionary should have two top level keys "name" - the name
             of the alert rule group and "rules" - the list of alert rules.
         """
-        failed_groups = []
+        group_digests = self._stored.group_digests
+        changed_groups = []
         for group in groups:
-            alert_uploaded = self._alertmanager.set_alert_rule_group(group)
-            if not alert_uploaded:
+            group_yaml = yaml.dump(group, Dumper=SafeDumper)
+            digest = hashlib.blake2b(group_yaml.encode("utf-8"), digest_size=16).hexdigest()
+            if group_digests.get(group["name"]) != digest:
+                changed_groups.append((group, group_yaml, digest))
+
+        uploaded = []
+        if len(changed_groups) == 1:
+            group, group_yaml, _ = changed_groups[0]
+            uploaded = [self._alertmanager.set_alert_rule_group(group, group_yaml)]
+        elif changed_groups:
+            # alert rule groups are independent so they are uploaded concurrently,
+            # each worker thread opens its own connection to Mimir so no more
+            # workers are used than there are groups
+            with ThreadPoolExecutor(max_workers=min(8, len(changed_groups))) as executor:
+                uploaded = list(
+                    executor.map(
+                        self._upload_alert_rule_group,
+                        [group for group, _, _ in changed_groups],
+                        [group_yaml for _, group_yaml, _ in changed_groups],
+                    )
+                )
+
+        failed_groups = []
+        for (group, _, digest), alert_uploaded in zip(changed_groups, uploaded):
+            if alert_uploaded:
+                group_digests[group["name"]] = digest
+            else:
                 logger.debug("Failed to set alert group %s", group)
                 failed_groups.append(group)
 
+        current_groups = {group["name"] for group in groups}
+        for groupname in [name for name in group_digests if name not in current_groups]:
+            if self._alertmanager.delete_alert_rule_group(groupname):
+                del group_digests[groupname]
+            else:
+                logger.debug("Failed to delete alert group %s", groupname)
+
+        self._alertmanager.close()
+
         return failed_groups
 
+    def _upload_alert_rule_group(self, group, group_yaml):
+        """Set an alert rule group from an upload worker thread.
+
+        The connection to Mimir opened by the worker thread is closed
+        once the alert rule group has been set.
+        """
+        try:
+            return self._alertmanager.set_alert_rule_group(group, group_yaml)
+        finally:
+            self._alertmanager.close()
+
     @property
     def hostname(self):
         """Fully qualified hostname of this unit.
@@ -272,7 +369,11 @@ class MimirWriterCharm(CharmBase):
         Returns:
             A string given fully qualified hostname of this unit.
         """
-        return socket.getfqdn()
+        # the lookup may block on DNS so it is done at most once per hook
+        if self._hostname is None:
+            self._hostname = socket.getfqdn()
+
+        return self._hostname
 
     @property
     def peer_relation(self):
@@ -291,16 +392,19 @@ class MimirWriterCharm(CharmBase):
         Returns:
             A mapping from peer unit names to peer hostnames.
         """
-        peers = {}
-        peers[self.unit.name] = str(self.hostname)
+        peers = {self.unit.name: str(self.hostname)}
 
-        if not self.peer_relation:
+        relation = self.peer_relation
+        if not relation:
             # just return self unit if no peers
             return peers
 
-        for unit in self.peer_relation.units:
-            if hostname := self.peer_relation.data[unit].get("peer_hostname"):
-                peers[unit.name] = hostname
+        data = relation.data
+        peers.update(
+            (unit.name, hostname)
+            for unit in relation.units
+            if (hostname := data[unit].get("peer_hostname"))
+        )
 
         return peers
 
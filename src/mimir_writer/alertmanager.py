@@ -6,16 +6,23 @@
 
 import json
 import logging
-from urllib.error import HTTPError, URLError
-from urllib.parse import urljoin
-from urllib.request import Request, urlopen
+import threading
+from http.client import HTTPConnection, HTTPException
 
 import yaml
 
 from .config import MIMIR_PORT
 
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
 logger = logging.getLogger(__name__)
 
+_YAML_HEADERS = {"Content-Type": "application/yaml"}
+
 DEFAULT_ALERT_TEMPLATE = r"""|
     {{ define "__alertmanager" }}AlertManager{{ end }}
     {{ define "__alertmanagerURL" }}{{ .ExternalURL }}/#/alerts?receiver={{ .Receiver | urlquery }}{{ end }}
@@ -33,6 +40,8 @@ DEFAULT_ALERTMANAGER_CONFIG = {
     "receivers": [{"name": "dummy", "webhook_configs": [{"url": "http://127.0.0.1:5001/"}]}],
 }
 
+DEFAULT_ALERTMANAGER_CONFIG_YAML = yaml.dump(DEFAULT_ALERTMANAGER_CONFIG, Dumper=SafeDumper)
+
 
 class AlertManager:
     """A Mimir Alertmanger."""
@@ -40,6 +49,10 @@ class AlertManager:
     def __init__(self, host="localhost", tenant="anonymous", timeout=10):
         """Construct and Mimir Alertmanager object.
 
+        API requests made by this object from the same thread share
+        a single persistent HTTP connection to Mimir, so requests may
+        safely be made concurrently from multiple threads.
+
         Args:
             host: string hostname or address of Alertmager which this
                 object must interface with.
@@ -50,6 +63,32 @@ class AlertManager:
         self._host = host
         self._timeout = timeout
         self._base_url = f"http://{self._host}:{MIMIR_PORT}"
+        self._config_path = "/api/v1/alerts"
+        self._alerts_path = "/prometheus/api/v1/alerts"
+        self._rules_path = "/prometheus/config/v1/rules"
+        self._tenant_rules_path = f"{self._rules_path}/{self._tenant}"
+        self._local = threading.local()
+
+    @property
+    def _connection(self) -> HTTPConnection:
+        """Persistent HTTP connection to Mimir for the calling thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = HTTPConnection(self._host, MIMIR_PORT, timeout=self._timeout)
+            self._local.connection = connection
+
+        return connection
+
+    def close(self):
+        """Close the persistent connection to Mimir of the calling thread.
+
+        A new connection is opened by the next request made from this
+        thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            del self._local.connection
 
     def set_config(self, config) -> str:
         """Set and Mimir Alertmanger configuration.
@@ -58,12 +97,12 @@ class AlertManager:
             config: A dictionary representing a valid Mimir Alertmanager
                 configuration.
         """
-        url = urljoin(self._base_url, "/api/v1/alerts")
-        headers = {"Content-Type": "application/yaml"}
-        post_data = yaml.dump(config).encode("utf-8")
-        response = self._post(url, post_data, headers=headers)
+        post_data = yaml.dump(
+            config, Dumper=SafeDumper, sort_keys=False, default_flow_style=False
+        ).encode("utf-8")
+        status, _ = self._request("POST", self._config_path, post_data, headers=_YAML_HEADERS)
 
-        return response
+        return status
 
     def get_alert_rules(self) -> dict:
         """Get all alert rules.
@@ -79,11 +118,10 @@ class AlertManager:
             Each alert rule dictionary contains the alert rule, name, expression,
             labels and annotations.
         """
-        url = urljoin(self._base_url, "/prometheus/config/v1/rules")
-        response = self._get(url)
+        _, response = self._request("GET", self._rules_path)
         rules = {}
         if response:
-            rules = yaml.safe_load(response)
+            rules = yaml.load(response, Loader=SafeLoader)
 
         return rules
 
@@ -94,26 +132,29 @@ class AlertManager:
             All alerts that are currently firing.
         """
         alerts = {}
-        url = urljoin(self._base_url, "/prometheus/api/v1/alerts")
-        response = self._get(url)
+        _, response = self._request("GET", self._alerts_path)
 
         if response:
             alerts = json.loads(response)
 
         return alerts
 
-    def set_alert_rule_group(self, group) -> str:
+    def set_alert_rule_group(self, group, group_yaml=None) -> str:
         """Set a new alert rule group.
 
         Args:
             group: a dictionary representing a single alert rule group.
+            group_yaml: an optional string YAML serialization of the group,
+                which is posted as is instead of serializing the group.
         """
-        url = urljoin(self._base_url, f"/prometheus/config/v1/rules/{self._tenant}")
-        headers = {"Content-Type": "application/yaml"}
-        post_data = yaml.dump(group).encode("utf-8")
-        response = self._post(url, post_data, headers=headers)
+        if group_yaml is None:
+            group_yaml = yaml.dump(group, Dumper=SafeDumper)
+        post_data = group_yaml.encode("utf-8")
+        status, _ = self._request(
+            "POST", self._tenant_rules_path, post_data, headers=_YAML_HEADERS
+        )
 
-        return response
+        return status
 
     def delete_alert_rule_group(self, groupname) -> str:
         """Delete an alert rule group.
@@ -121,79 +162,60 @@ class AlertManager:
         Args:
             groupname: a string representing the name of group to be deleted.
         """
-        url = urljoin(self._base_url, f"/prometheus/config/v1/rules/{self._tenant}/{groupname}")
-        response = self._delete(url)
-
-        return response
-
-    def _get(self, url, headers=None, timeout=None, encoding="utf-8") -> str:
-        """Make a HTTP GET request to Mimir Alertmanager."""
-        body = ""
-        request = Request(url, headers=headers or {}, method="GET")
-        timeout = timeout if timeout else self._timeout
+        path = f"{self._tenant_rules_path}/{groupname}"
+        status, _ = self._request("DELETE", path)
 
-        try:
-            with urlopen(request, timeout=timeout) as response:
-                body = response.read()
-                charset = response.headers.get_content_charset()
-                enc = charset if charset else encoding
-                body = body.decode(encoding=enc)
-        except HTTPError as error:
-            logger.debug(
-                "Failed to fetch %s, status: %s, reason: %s",
-                url,
-                error.status,
-                error.reason,
-            )
-        except URLError as error:
-            logger.debug("Invalid URL %s : %s", url, error)
-        except TimeoutError:
-            logger.debug("Request timeout fetching URL %s", url)
+        return status
 
-        return body
+    def _request(self, method, path, body=None, headers=None, encoding="utf-8") -> tuple:
+        """Make a HTTP request to Mimir Alertmanager.
 
-    def _post(self, url, post_data, headers=None, timeout=None) -> str:
-        """Make a HTTP POST request to Mimir Alertmanager."""
-        status = ""
-        timeout = timeout if timeout else self._timeout
-        request = Request(url, headers=headers or {}, data=post_data, method="POST")
+        The request is sent over the persistent connection to Mimir. If
+        Mimir has closed this connection since the previous request, it
+        is reopened and the request is retried once.
 
-        try:
-            with urlopen(request, timeout=timeout) as response:
-                status = response.status
-        except HTTPError as error:
+        Returns:
+            A tuple of the response status and the decoded response body.
+            Both are empty strings if the request failed. The body is an
+            empty string if it could not be decoded.
+        """
+        url = f"{self._base_url}{path}"
+
+        for retry in (True, False):
+            try:
+                self._connection.request(method, path, body=body, headers=headers or {})
+                response = self._connection.getresponse()
+                data = response.read()
+                break
+            except (BrokenPipeError, ConnectionResetError) as error:
+                self._connection.close()
+                if not retry:
+                    logger.debug("Connection lost during %s %s : %s", method, url, error)
+                    return "", ""
+            except TimeoutError:
+                self._connection.close()
+                logger.debug("Request timeout during %s %s", method, url)
+                return "", ""
+            except (HTTPException, OSError) as error:
+                self._connection.close()
+                logger.debug("Failed %s %s : %s", method, url, error)
+                return "", ""
+
+        if response.status >= 400:
             logger.debug(
-                "Failed posting to %s, status: %s, reason: %s",
+                "Failed %s %s, status: %s, reason: %s",
+                method,
                 url,
-                error.status,
-                error.reason,
+                response.status,
+                response.reason,
             )
-        except URLError as error:
-            logger.debug("Invalid URL %s : %s", url, error)
-        except TimeoutError:
-            logger.debug("Request timeout during posting to URL %s", url)
-
-        return status
-
-    def _delete(self, url, headers=None, timeout=None) -> str:
-        """Make a HTTP DELETE request to Mimir Alertmanager."""
-        status = ""
-        timeout = timeout if timeout else self._timeout
-        request = Request(url, headers=headers or {}, method="DELETE")
+            return "", ""
 
+        charset = response.headers.get_content_charset()
         try:
-            with urlopen(request, timeout=timeout) as response:
-                status = response.status
-        except HTTPError as error:
-            logger.debug(
-                "Delete failed %s, status: %s, reason: %s",
-                url,
-                error.status,
-                error.reason,
-            )
-        except URLError as error:
-            logger.debug("Invalid URL %s : %s", url, error)
-        except TimeoutError:
-            logger.debug("Request timeout deleting %s", url)
+            body = data.decode(encoding=charset if charset else encoding)
+        except (LookupError, UnicodeDecodeError) as error:
+            logger.debug("Failed decoding response to %s %s : %s", method, url, error)
+            body = ""
 
-        return status
+        return response.status, body
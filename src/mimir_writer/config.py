@@ -21,34 +21,49 @@ MIMIR_DIRS = {
 }
 
 
+# static configuration sections, these are shared and must not be mutated
+_COMPACTOR_CONFIG = {
+    "data_dir": MIMIR_DIRS["compactor"],
+    "sharding_ring": {"kvstore": {"store": "memberlist"}},
+}
+
+_RULER_CONFIG = {"alertmanager_url": f"http://localhost:{MIMIR_PORT}/alertmanager"}
+
+_RULER_STORAGE_CONFIG = {"backend": "filesystem", "filesystem": {"dir": MIMIR_DIRS["rules"]}}
+
+_SERVER_CONFIG = {"http_listen_port": MIMIR_PORT, "log_level": "error"}
+
+_STORE_GATEWAY_CONFIG = {"sharding_ring": {"replication_factor": 1}}
+
+_ALERTMANAGER_STORAGE_CONFIG = {
+    "backend": "filesystem",
+    "filesystem": {"dir": MIMIR_DIRS["data-alertmanager"]},
+}
+
 logger = logging.getLogger(__name__)
 
 
 def block_storage_config(s3_config, retention_period):
     """Mimir Blocks Storage configuration."""
-    cfg = {
+    if s3_config:
+        return {
+            "backend": "s3",
+            "bucket_store": {"sync_dir": MIMIR_DIRS["bucket_store"]},
+            "tsdb": {"dir": MIMIR_DIRS["tsdb"], "retention_period": retention_period},
+            "s3": s3_config,
+        }
+
+    return {
+        "backend": "filesystem",
         "bucket_store": {"sync_dir": MIMIR_DIRS["bucket_store"]},
         "tsdb": {"dir": MIMIR_DIRS["tsdb"], "retention_period": retention_period},
+        "filesystem": {"dir": MIMIR_DIRS["data"]},
     }
 
-    if s3_config:
-        cfg["backend"] = "s3"
-        cfg["s3"] = s3_config
-    else:
-        cfg["backend"] = "filesystem"
-        cfg["filesystem"] = {"dir": MIMIR_DIRS["data"]}
-
-    return cfg
-
 
 def compactor_config():
     """Mimir Compactor configuration."""
-    cfg = {
-        "data_dir": MIMIR_DIRS["compactor"],
-        "sharding_ring": {"kvstore": {"store": "memberlist"}},
-    }
-
-    return cfg
+    return _COMPACTOR_CONFIG
 
 
 def distributor_config(hostname):
@@ -75,40 +90,27 @@ def ingester_config(hostname):
 
 def ruler_config():
     """Mimir Ruler configuration."""
-    cfg = {"alertmanager_url": f"http://localhost:{MIMIR_PORT}/alertmanager"}
-
-    return cfg
+    return _RULER_CONFIG
 
 
 def ruler_storage_config():
     """Mimir Ruler Storage configuration."""
-    cfg = {"backend": "filesystem", "filesystem": {"dir": MIMIR_DIRS["rules"]}}
-
-    return cfg
+    return _RULER_STORAGE_CONFIG
 
 
 def server_config():
     """Mimir Server configuration."""
-    cfg = {"http_listen_port": MIMIR_PORT, "log_level": "error"}
-
-    return cfg
+    return _SERVER_CONFIG
 
 
 def store_gateway_config():
     """Mimir Store Gateway configuration."""
-    cfg = {"sharding_ring": {"replication_factor": 1}}
-
-    return cfg
+    return _STORE_GATEWAY_CONFIG
 
 
 def alertmanager_storage_config():
     """Mimir Alertmanager Storage configuration."""
-    cfg = {
-        "backend": "filesystem",
-        "filesystem": {"dir": MIMIR_DIRS["data-alertmanager"]},
-    }
-
-    return cfg
+    return _ALERTMANAGER_STORAGE_CONFIG
 
 
 def memberlist_config(nodename, peers, readers):
@@ -126,8 +128,7 @@ def memberlist_config(nodename, peers, readers):
         readers: a list of Mimir reader unit hostnames of all reader units
              related to this Mimir writer charm.
     """
-    members = list(peers.values())
-    members.extend(readers)
+    members = [*peers.values(), *readers]
     logger.debug("Mimir writer memberlist : %s", members)
     cfg = {"node_name": nodename, "join_members": members}
 
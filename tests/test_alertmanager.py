@@ -0,0 +1,89 @@
+# Copyright 2022 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from http.client import HTTPMessage, RemoteDisconnected
+
+from mimir_writer.alertmanager import AlertManager
+
+
+class StubResponse:
+    def __init__(self, status, body=b"", content_type="application/json"):
+        self.status = status
+        self.reason = "reason"
+        self.headers = HTTPMessage()
+        self.headers["Content-Type"] = content_type
+        self._body = body
+
+    def read(self):
+        return self._body
+
+
+class StubConnection:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.closed = 0
+
+    def request(self, method, path, body=None, headers=None):
+        self.requests.append((method, path, body))
+
+    def getresponse(self):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed += 1
+
+
+class TestAlertManager(unittest.TestCase):
+    def setUp(self):
+        self.alertmanager = AlertManager()
+
+    def use_connection(self, connection):
+        self.alertmanager._local.connection = connection
+
+    def test_successful_request_returns_status_and_body(self):
+        self.use_connection(StubConnection(StubResponse(200, b'{"status": "success"}')))
+
+        status, body = self.alertmanager._request("GET", "/prometheus/api/v1/alerts")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, '{"status": "success"}')
+
+    def test_failed_request_returns_empty_status(self):
+        self.use_connection(StubConnection(StubResponse(400, b"bad request")))
+
+        self.assertEqual(self.alertmanager.set_alert_rule_group({"name": "group"}), "")
+
+    def test_request_is_retried_once_on_disconnect(self):
+        connection = StubConnection(RemoteDisconnected(), StubResponse(202))
+        self.use_connection(connection)
+
+        self.assertEqual(self.alertmanager.delete_alert_rule_group("group"), 202)
+        self.assertEqual(len(connection.requests), 2)
+        self.assertEqual(connection.closed, 1)
+
+    def test_request_is_not_retried_twice_on_disconnect(self):
+        connection = StubConnection(RemoteDisconnected(), RemoteDisconnected())
+        self.use_connection(connection)
+
+        self.assertEqual(self.alertmanager.delete_alert_rule_group("group"), "")
+        self.assertEqual(len(connection.requests), 2)
+
+    def test_undecodable_body_keeps_status(self):
+        response = StubResponse(200, b"\xff", content_type="text/plain; charset=bogus")
+        self.use_connection(StubConnection(response))
+
+        self.assertEqual(self.alertmanager._request("GET", "/prometheus/api/v1/alerts"), (200, ""))
+
+    def test_close_drops_connection(self):
+        connection = StubConnection()
+        self.use_connection(connection)
+
+        self.alertmanager.close()
+
+        self.assertEqual(connection.closed, 1)
+        self.assertIsNot(self.alertmanager._connection, connection)
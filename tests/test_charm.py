@@ -1,9 +1,12 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import threading
 import unittest
+from unittest.mock import PropertyMock, patch
 
 from charm import MimirWriterCharm
+from ops.model import ActiveStatus, BlockedStatus, Container
 from ops.testing import Harness
 
 
@@ -11,5 +14,187 @@ class TestCharm(unittest.TestCase):
     def setUp(self):
         self.harness = Harness(MimirWriterCharm)
         self.addCleanup(self.harness.cleanup)
+        self.harness.set_can_connect("mimir-writer", True)
         self.harness.begin()
 
+        patcher = patch("mimir_writer.alertmanager.AlertManager.set_config", return_value=202)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch.object(Container, "restart")
+    @patch.object(Container, "push")
+    def test_unchanged_config_is_not_pushed(self, push, restart):
+        self.harness.charm.on.config_changed.emit()
+        push.reset_mock()
+        restart.reset_mock()
+
+        self.harness.charm.on.config_changed.emit()
+
+        push.assert_not_called()
+        restart.assert_not_called()
+
+    @patch.object(Container, "restart")
+    @patch.object(Container, "push")
+    def test_s3_change_pushes_config_and_restarts(self, push, restart):
+        self.harness.charm.on.config_changed.emit()
+        push.reset_mock()
+        restart.reset_mock()
+
+        self.harness.update_config({"s3": '{"bucket_name": "mimir"}'})
+
+        push.assert_called_once()
+        self.assertIn("bucket_name: mimir", push.call_args.args[1])
+        restart.assert_called_once_with("mimir-writer")
+
+    @patch.object(Container, "restart")
+    @patch.object(Container, "push")
+    def test_retention_period_change_pushes_config_and_restarts(self, push, restart):
+        config = {"s3": "", "alertmanager_template": "", "alertmanager_config": ""}
+        with patch.object(MimirWriterCharm, "config", new_callable=PropertyMock) as charm_config:
+            charm_config.return_value = config
+            self.harness.charm.on.config_changed.emit()
+            push.reset_mock()
+            restart.reset_mock()
+
+            charm_config.return_value = {**config, "tsdb_block_retention_period": "48h"}
+            self.harness.charm.on.config_changed.emit()
+
+        push.assert_called_once()
+        self.assertIn("retention_period: 48h", push.call_args.args[1])
+        restart.assert_called_once_with("mimir-writer")
+
+    @patch.object(Container, "restart")
+    @patch.object(Container, "push")
+    def test_pebble_ready_always_pushes_config(self, push, _):
+        self.harness.charm.on.config_changed.emit()
+        push.reset_mock()
+
+        self.harness.container_pebble_ready("mimir-writer")
+
+        push.assert_called_once()
+
+    @patch.object(Container, "restart")
+    def test_s3_config_is_parsed_as_json_or_yaml(self, _):
+        self.harness.update_config({"s3": '{"bucket_name": "foo", "endpoint": "bar"}'})
+        json_config = self.harness.charm._mimir_config()
+        self.harness.update_config({"s3": "bucket_name: foo\nendpoint: bar"})
+        yaml_config = self.harness.charm._mimir_config()
+
+        s3_block = "  s3:\n    bucket_name: foo\n    endpoint: bar\n"
+        self.assertIn("backend: s3", json_config)
+        self.assertIn(s3_block, json_config)
+        self.assertIn(s3_block, yaml_config)
+
+    @patch.object(Container, "restart")
+    def test_empty_s3_config_uses_filesystem_storage(self, _):
+        self.harness.update_config({"s3": ""})
+
+        self.assertIn("backend: filesystem", self.harness.charm._mimir_config())
+
+    @patch.object(Container, "restart")
+    def test_unchanged_config_clears_blocked_status(self, _):
+        self.harness.set_planned_units(2)
+        self.harness.charm.on.config_changed.emit()
+        self.assertIsInstance(self.harness.model.unit.status, BlockedStatus)
+
+        self.harness.set_planned_units(1)
+        self.harness.update_config({"alertmanager_template": "template"})
+
+        self.assertEqual(self.harness.model.unit.status, ActiveStatus())
+
+
+class TestAlertRules(unittest.TestCase):
+    def setUp(self):
+        self.harness = Harness(MimirWriterCharm)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+        patcher = patch("mimir_writer.alertmanager.AlertManager.set_alert_rule_group")
+        self.set_group = patcher.start()
+        self.set_group.return_value = 202
+        self.addCleanup(patcher.stop)
+
+        patcher = patch("mimir_writer.alertmanager.AlertManager.delete_alert_rule_group")
+        self.delete_group = patcher.start()
+        self.delete_group.return_value = 202
+        self.addCleanup(patcher.stop)
+
+        self.groups = [
+            {"name": "a", "rules": [{"alert": "A", "expr": "up == 0"}]},
+            {"name": "b", "rules": [{"alert": "B", "expr": "up == 0"}]},
+        ]
+
+    def test_unchanged_groups_are_not_posted_again(self):
+        self.harness.charm._set_alert_rules(self.groups)
+        self.assertEqual(self.set_group.call_count, 2)
+        self.set_group.reset_mock()
+
+        self.harness.charm._set_alert_rules(self.groups)
+
+        self.set_group.assert_not_called()
+        self.delete_group.assert_not_called()
+
+    @patch("charm.ThreadPoolExecutor")
+    def test_single_changed_group_is_posted_inline(self, executor):
+        self.harness.charm._set_alert_rules(self.groups[:1])
+
+        executor.assert_not_called()
+        self.set_group.assert_called_once()
+
+    @patch("mimir_writer.alertmanager.AlertManager.close")
+    def test_connection_is_closed_after_setting_groups(self, close):
+        self.harness.charm._set_alert_rules(self.groups[:1])
+
+        close.assert_called_once()
+
+    @patch("mimir_writer.alertmanager.AlertManager.close")
+    def test_worker_connections_are_closed_after_pooled_upload(self, close):
+        upload_threads = set()
+        closed_threads = set()
+        self.set_group.side_effect = lambda *_: upload_threads.add(threading.get_ident()) or 202
+        close.side_effect = lambda: closed_threads.add(threading.get_ident())
+
+        self.harness.charm._set_alert_rules(self.groups)
+
+        self.assertEqual(self.set_group.call_count, 2)
+        self.assertNotIn(threading.get_ident(), upload_threads)
+        self.assertLessEqual(upload_threads, closed_threads)
+
+    def test_removed_groups_are_deleted(self):
+        self.harness.charm._set_alert_rules(self.groups)
+        self.set_group.reset_mock()
+
+        self.harness.charm._set_alert_rules(self.groups[:1])
+
+        self.set_group.assert_not_called()
+        self.delete_group.assert_called_once_with("b")
+
+    def test_failed_groups_are_retried(self):
+        self.set_group.return_value = ""
+        failed_groups = self.harness.charm._set_alert_rules(self.groups[:1])
+        self.assertEqual(failed_groups, self.groups[:1])
+
+        self.set_group.reset_mock()
+        self.set_group.return_value = 202
+        failed_groups = self.harness.charm._set_alert_rules(self.groups[:1])
+
+        self.assertEqual(failed_groups, [])
+        self.set_group.assert_called_once()
+        group, group_yaml = self.set_group.call_args.args
+        self.assertEqual(group, self.groups[0])
+        self.assertIn("name: a", group_yaml)
+
+
+class TestHostname(unittest.TestCase):
+    def setUp(self):
+        self.harness = Harness(MimirWriterCharm)
+        self.addCleanup(self.harness.cleanup)
+
+    @patch("socket.getfqdn", return_value="mimir-writer-0.example")
+    def test_hostname_is_looked_up_once_on_first_use(self, getfqdn):
+        self.harness.begin()
+        getfqdn.assert_not_called()
+
+        self.assertEqual(self.harness.charm.hostname, "mimir-writer-0.example")
+        self.assertEqual(self.harness.charm.hostname, "mimir-writer-0.example")
+        getfqdn.assert_called_once()